@@ -1,268 +1,370 @@
-"""
-Purpose:
-    Single-file Bronze → Silver processing pipeline for supply chain data.
-
-What this script does:
-    - Processes a single large CSV file from the Bronze layer
-    - Validates records, removes duplicates, and cleans schema issues
-    - Derives financial, operational, and strategic analytical fields
-    - Enriches data by joining curated dimension tables
-    - Writes a single Parquet fact file to the Silver layer
-    - Archives the processed source file to ensure idempotency
-
-What this script does NOT do:
-    - No batch orchestration
-    - No model training or synthetic data generation
-    - No SQL loading or BI logic
-"""
-
-import polars as pl
-import shutil
-import os
-from datetime import datetime
-
-# ==============================================================================
-# CONFIGURATION & PATHS
-# ==============================================================================
-# Source file (Bronze Layer)
-SOURCE_FILE_PATH = r"D:\Data Lake\Bronze\DataCo_Final_2M.csv"
-
-# Target output (Silver Layer)
-TARGET_FILE_PATH = r"D:\Data Lake\Silver\DataCo_Silver.parquet"
-
-# Archive location for processed source files
-ARCHIVE_FOLDER = r"D:\Data Lake\Archive"
-
-# Dimension tables (pre-cleaned, static Parquet files)
-DIM_PATHS = {
-    "geo":  r"D:\Data Lake\Silver\dim_geo.parquet",
-    "cust": r"D:\Data Lake\Silver\Dim_Customer_Geo.parquet",
-    "prod": r"D:\Data Lake\Silver\Dim_Product.parquet"
-}
-
-# ==============================================================================
-# PIPELINE EXECUTION
-# ==============================================================================
-file_name = os.path.basename(SOURCE_FILE_PATH)
-print(f"Starting single-file pipeline for: {file_name}")
-
-try:
-    # --------------------------------------------------------------------------
-    # STEP 1: LOAD & INITIAL CLEANUP
-    # --------------------------------------------------------------------------
-    # Using cp1252 encoding to handle Western European character sets correctly
-    df = pl.read_csv(SOURCE_FILE_PATH, encoding="cp1252")
-    print(f"Original row count: {df.height}")
-
-    # Validate dates early to prevent invalid records from propagating
-    df = (
-        df
-        .with_columns(
-            pl.format(
-                "{}-{}-{}",
-                pl.col("order_year"),
-                pl.col("order_month"),
-                pl.col("order_day")
-            )
-            .str.to_date("%Y-%m-%d", strict=False)
-            .alias("valid_date_check")
-        )
-        .filter(pl.col("valid_date_check").is_not_null())
-    )
-
-    # Deduplicate while preserving source order
-    rows_before = df.height
-    df = df.unique(maintain_order=True)
-    rows_after = df.height
-
-    if rows_before != rows_after:
-        print(f"Removed {rows_before - rows_after} duplicate rows.")
-
-    # Drop helper and unused source columns
-    df = df.drop([
-        "order_dayofweek",
-        "valid_date_check",
-        "shipping_mode"
-    ])
-
-    # --------------------------------------------------------------------------
-    # STEP 2: FINANCIAL METRIC DERIVATION (P&L FOUNDATION)
-    # --------------------------------------------------------------------------
-    df = (
-        df
-        .with_columns([
-            (pl.col("order_item_product_price") * pl.col("order_item_quantity"))
-            .alias("gross_sales"),
-
-            (
-                (pl.col("order_item_product_price") * pl.col("order_item_quantity"))
-                * pl.col("order_item_discount_rate")
-            ).alias("discount_amount")
-        ])
-        .with_columns([
-            (pl.col("gross_sales") - pl.col("discount_amount"))
-            .alias("net_revenue")
-        ])
-        .with_columns([
-            (pl.col("net_revenue") * pl.col("order_item_profit_ratio"))
-            .alias("order_profit_amount")
-        ])
-        .with_columns([
-            (pl.col("net_revenue") - pl.col("order_profit_amount"))
-            .alias("total_cost")
-        ])
-    )
-
-    # --------------------------------------------------------------------------
-    # STEP 3: OPERATIONAL & STRATEGIC FEATURES
-    # --------------------------------------------------------------------------
-    df = (
-        df
-        .with_columns([
-            (pl.col("total_cost") / pl.col("order_item_quantity"))
-            .alias("actual_unit_cost"),
-
-            (pl.col("order_profit_amount") < 0)
-            .alias("is_profit_bleeder"),
-
-            (pl.col("days_for_shipping_real")
-             - pl.col("days_for_shipment_scheduled"))
-            .alias("shipping_delta")
-        ])
-        .with_columns([
-            (
-                (pl.col("order_item_product_price") - pl.col("actual_unit_cost"))
-                / pl.col("actual_unit_cost")
-            ).alias("markup_pct"),
-
-            (
-                pl.col("discount_amount")
-                / (pl.col("order_profit_amount") + pl.col("discount_amount"))
-            ).fill_nan(0.0).alias("margin_leakage_pct")
-        ])
-    )
-
-    # Categorical segmentation for analysis
-    df = df.with_columns([
-        pl.when(pl.col("shipping_delta") < 0).then("Early")
-          .when(pl.col("shipping_delta") == 0).then("On Time")
-          .otherwise("Late")
-          .alias("delivery_class"),
-
-        pl.when(pl.col("days_for_shipment_scheduled") == 0).then("Same Day")
-          .when(pl.col("days_for_shipment_scheduled") <= 2).then("First Class")
-          .when(pl.col("days_for_shipment_scheduled") == 3).then("Second Class")
-          .otherwise("Standard Class")
-          .alias("shipping_mode_clean"),
-
-        pl.date(
-            pl.col("order_year"),
-            pl.col("order_month"),
-            pl.col("order_day")
-        ).dt.strftime("%A").alias("day_name_str"),
-
-        pl.when(
-            pl.date(
-                pl.col("order_year"),
-                pl.col("order_month"),
-                pl.col("order_day")
-            )
-            .dt.strftime("%A")
-            .is_in(["Saturday", "Sunday"])
-        )
-        .then("Weekend")
-        .otherwise("Weekday")
-        .alias("order_day_type"),
-
-        pl.when(pl.col("order_item_product_price") < 60).then("Budget")
-          .when(pl.col("order_item_product_price") <= 250).then("Mainstream")
-          .otherwise("Premium")
-          .alias("price_segment"),
-
-        (
-            pl.col("customer_country").str.replace("EE. UU.", "USA")
-            + "_"
-            + pl.col("customer_state")
-            + " -> "
-            + pl.col("order_country")
-        ).alias("trade_route")
-    ])
-
-    # --------------------------------------------------------------------------
-    # STEP 4: CONTEXTUAL WINDOW METRICS
-    # --------------------------------------------------------------------------
-    df = (
-        df
-        .with_columns([
-            (pl.col("gross_sales")
-             / pl.col("gross_sales").sum().over("category_name"))
-            .alias("category_share_pct"),
-
-            pl.col("order_state").count().over("order_state")
-            .alias("state_order_count"),
-
-            (pl.col("gross_sales")
-             / pl.col("gross_sales").sum().over("market"))
-            .alias("market_share_pct")
-        ])
-        .with_columns([
-            pl.when(pl.col("state_order_count") > 100).then("Strategic Hub")
-              .when(pl.col("state_order_count") < 10).then("Expansion Zone")
-              .otherwise("Standard Zone")
-              .alias("state_density_class")
-        ])
-    )
-
-    # --------------------------------------------------------------------------
-    # STEP 5: STAR SCHEMA ENRICHMENT
-    # --------------------------------------------------------------------------
-    dim_geo = pl.read_parquet(DIM_PATHS["geo"])
-    dim_cust = pl.read_parquet(DIM_PATHS["cust"])
-    dim_prod = pl.read_parquet(DIM_PATHS["prod"])
-
-    df = (
-        df
-        .join(dim_geo,
-              on=["order_state", "order_country", "order_region", "market"],
-              how="left")
-        .drop(["order_state", "order_country", "order_region", "market"])
-        .join(dim_cust,
-              on=["customer_state", "customer_country"],
-              how="left")
-        .drop(["customer_state", "customer_country"])
-        .join(dim_prod,
-              on=["product_name", "category_name", "department_name"],
-              how="left")
-        .drop(["product_name", "category_name", "department_name"])
-    )
-
-    # --------------------------------------------------------------------------
-    # STEP 6: FINAL SORT & EXPORT
-    # --------------------------------------------------------------------------
-    # Sorting ensures stable downstream clustered indexing in SQL
-    df = df.sort(
-        ["order_year", "order_month", "order_day", "order_item_quantity"]
-    )
-
-    # Normalize column naming
-    df = df.rename({col: col.lower() for col in df.columns})
-
-    df.write_parquet(TARGET_FILE_PATH)
-    print(f"Processed file saved to: {TARGET_FILE_PATH}")
-    print(f"Final row count: {df.height}")
-
-    # --------------------------------------------------------------------------
-    # STEP 7: ARCHIVAL (IDEMPOTENCY)
-    # --------------------------------------------------------------------------
-    os.makedirs(ARCHIVE_FOLDER, exist_ok=True)
-
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    name, ext = os.path.splitext(file_name)
-    archive_name = f"{name}_{timestamp}{ext}"
-
-    shutil.move(SOURCE_FILE_PATH, os.path.join(ARCHIVE_FOLDER, archive_name))
-    print(f"Archived source file as: {archive_name}")
-
-except Exception as e:
-    print("Pipeline failed.")
-    print(f"Error details: {e}")
+"""
+Purpose:
+    Single-file Bronze → Silver processing pipeline for supply chain data.
+
+What this script does:
+    - Processes a single large CSV file from the Bronze layer
+    - Validates records, removes duplicates, and cleans schema issues
+    - Derives financial, operational, and strategic analytical fields
+    - Enriches data by joining curated dimension tables
+    - Writes a single Parquet fact file to the Silver layer
+    - Archives the processed source file to ensure idempotency
+
+What this script does NOT do:
+    - No batch orchestration
+    - No model training or synthetic data generation
+    - No SQL loading or BI logic
+"""
+
+import polars as pl
+import shutil
+import os
+from datetime import datetime
+
+# ==============================================================================
+# CONFIGURATION & PATHS
+# ==============================================================================
+# Source file (Bronze Layer)
+SOURCE_FILE_PATH = r"D:\Data Lake\Bronze\DataCo_Final_2M.csv"
+
+# Target output (Silver Layer)
+TARGET_FILE_PATH = r"D:\Data Lake\Silver\DataCo_Silver.parquet"
+
+# Archive location for processed source files
+ARCHIVE_FOLDER = r"D:\Data Lake\Archive"
+
+# Dimension tables (pre-cleaned, static Parquet files)
+DIM_PATHS = {
+    "geo":  r"D:\Data Lake\Silver\dim_geo.parquet",
+    "cust": r"D:\Data Lake\Silver\Dim_Customer_Geo.parquet",
+    "prod": r"D:\Data Lake\Silver\Dim_Product.parquet"
+}
+
+# ==============================================================================
+# SOURCE SCHEMA CONTRACT
+# ==============================================================================
+# Full column contract for Bronze CSV files, in physical column order as
+# produced by the synthetic data generation step (data_scaling notebooks).
+# Passing this to scan_csv skips schema inference entirely, so the file is
+# parsed in a single streaming pass instead of an inference pass plus a read.
+SCHEMA: dict[str, pl.DataType] = {
+    "type":                        pl.Categorical,
+    "days_for_shipping_real":      pl.Int8,
+    "days_for_shipment_scheduled": pl.Int8,
+    "customer_segment":            pl.Categorical,
+    "customer_state":              pl.Categorical,
+    "order_date_dateorders":       pl.Utf8,
+    "order_item_discount_rate":    pl.Float32,
+    "order_item_product_price":    pl.Float32,
+    "order_item_profit_ratio":     pl.Float32,
+    "order_item_quantity":         pl.Int32,
+    "order_state":                 pl.Categorical,
+    "order_status":                pl.Categorical,
+    "product_name":                pl.Categorical,
+    "shipping_mode":               pl.Utf8,
+    "order_year":                  pl.Int16,
+    "order_month":                 pl.Int8,
+    "order_day":                   pl.Int8,
+    "order_dayofweek":             pl.Int8,
+    "order_country":               pl.Categorical,
+    "order_region":                pl.Categorical,
+    "market":                      pl.Categorical,
+    "category_name":               pl.Categorical,
+    "department_name":             pl.Categorical,
+    "customer_country":            pl.Categorical,
+}
+
+# ==============================================================================
+# PIPELINE EXECUTION
+# ==============================================================================
+file_name = os.path.basename(SOURCE_FILE_PATH)
+print(f"Starting single-file pipeline for: {file_name}")
+
+try:
+    # --------------------------------------------------------------------------
+    # STEP 1: LAZY SCAN & INITIAL CLEANUP
+    # --------------------------------------------------------------------------
+    # The whole pipeline is a single LazyFrame plan: nothing is materialized
+    # until the final sink, letting Polars stream the file and push projections
+    # and predicates down into the scan itself.
+    # utf8-lossy handles the Western European characters left in the source.
+    # The explicit schema skips inference; low_memory keeps chunk buffers small
+    lf = pl.scan_csv(
+        SOURCE_FILE_PATH,
+        encoding="utf8-lossy",
+        schema=SCHEMA,
+        low_memory=True
+    )
+
+    # Validate dates early to prevent invalid records from propagating.
+    # The check is pure integer arithmetic: a days-in-month lookup (with a
+    # leap-year adjustment for February) bounds order_day, so no string
+    # column is allocated and no date parser runs. The surviving rows then
+    # get a proper Date column built directly from the three components.
+    # order_date is built exactly once here, reused for every downstream
+    # date derivation, and persisted in the Silver output (4 bytes/row) as
+    # the natural join key should a Dim_Date ever be added. The SQL fact
+    # contract still carries year/month/day - Fact_Sales keeps those three
+    # columns and derives its own PERSISTED order_date from them (see
+    # sql/02_add_persisted_columns.sql).
+    days_in_month = pl.col("order_month").replace_strict(
+        {1: 31, 2: 28, 3: 31, 4: 30, 5: 31, 6: 30,
+         7: 31, 8: 31, 9: 30, 10: 31, 11: 30, 12: 31},
+        default=0,
+        return_dtype=pl.Int8
+    )
+    is_leap_february = (
+        (pl.col("order_month") == 2)
+        & (
+            ((pl.col("order_year") % 4 == 0) & (pl.col("order_year") % 100 != 0))
+            | (pl.col("order_year") % 400 == 0)
+        )
+    )
+    lf = (
+        lf
+        .filter(
+            pl.col("order_day").is_between(
+                1, days_in_month + is_leap_february.cast(pl.Int8)
+            )
+        )
+        .with_columns(
+            pl.date(
+                pl.col("order_year"),
+                pl.col("order_month"),
+                pl.col("order_day")
+            ).alias("order_date")
+        )
+    )
+
+    # Deduplicate on the full row: the source carries no surviving natural
+    # key (order ids are stripped during upstream cleaning), so every column
+    # participates. maintain_order=False takes the parallel hash path, and
+    # nothing downstream depends on row order since the final sort was removed.
+    lf = lf.unique(maintain_order=False)
+
+    # Drop helper and unused source columns
+    lf = lf.drop([
+        "order_dayofweek",
+        "shipping_mode"
+    ])
+
+    # --------------------------------------------------------------------------
+    # STEP 2: FINANCIAL METRIC DERIVATION (P&L FOUNDATION)
+    # --------------------------------------------------------------------------
+    # Each metric is let-bound to a Python variable and reuses the previous
+    # binding, so the whole P&L ladder lands in one with_columns pass with no
+    # duplicated subexpressions and a single projection node in the plan
+    gross_sales = (
+        pl.col("order_item_product_price") * pl.col("order_item_quantity")
+    )
+    discount_amount = gross_sales * pl.col("order_item_discount_rate")
+    net_revenue = gross_sales - discount_amount
+    order_profit_amount = net_revenue * pl.col("order_item_profit_ratio")
+    total_cost = net_revenue - order_profit_amount
+
+    lf = lf.with_columns([
+        gross_sales.alias("gross_sales"),
+        discount_amount.alias("discount_amount"),
+        net_revenue.alias("net_revenue"),
+        order_profit_amount.alias("order_profit_amount"),
+        total_cost.alias("total_cost")
+    ])
+
+    # --------------------------------------------------------------------------
+    # STEP 3: OPERATIONAL & STRATEGIC FEATURES
+    # --------------------------------------------------------------------------
+    # Same let-binding pattern as the P&L ladder: actual_unit_cost feeds
+    # markup_pct, so binding it once lets the whole block fuse into a
+    # single projection instead of two chained with_columns passes
+    actual_unit_cost = pl.col("total_cost") / pl.col("order_item_quantity")
+
+    lf = lf.with_columns([
+        actual_unit_cost.alias("actual_unit_cost"),
+
+        (pl.col("order_profit_amount") < 0)
+        .alias("is_profit_bleeder"),
+
+        (pl.col("days_for_shipping_real")
+         - pl.col("days_for_shipment_scheduled"))
+        .alias("shipping_delta"),
+
+        (
+            (pl.col("order_item_product_price") - actual_unit_cost)
+            / actual_unit_cost
+        ).alias("markup_pct"),
+
+        (
+            pl.col("discount_amount")
+            / (pl.col("order_profit_amount") + pl.col("discount_amount"))
+        ).fill_nan(0.0).alias("margin_leakage_pct")
+    ])
+
+    # Categorical segmentation for analysis. The weekday is let-bound as an
+    # expression rather than materialized as a scratch column; both day
+    # columns below reuse the one binding. Note is_profit_bleeder above stays
+    # a bitmap-backed Boolean (1 bit/row) end to end - it feeds the BIT
+    # column in SQL - and shipping_delta arithmetic stays in Int8.
+    order_weekday = pl.col("order_date").dt.weekday()
+
+    lf = lf.with_columns([
+        # Range bucketing is a single branchless binary search per row via
+        # cut, which also returns dictionary-encoded labels directly
+        pl.col("shipping_delta")
+        .cut(breaks=[-1, 0], labels=["Early", "On Time", "Late"])
+        .alias("delivery_class"),
+
+        pl.col("days_for_shipment_scheduled")
+        .cut(breaks=[0, 2, 3],
+             labels=["Same Day", "First Class", "Second Class", "Standard Class"])
+        .alias("shipping_mode_clean"),
+
+        # Both day columns derive from the ISO weekday integer: the name via
+        # a 7-entry lookup, the weekend flag via one integer comparison.
+        # Categorical output keeps downstream group_bys hashing dictionary
+        # codes instead of strings
+        order_weekday.replace_strict(
+            {1: "Monday", 2: "Tuesday", 3: "Wednesday", 4: "Thursday",
+             5: "Friday", 6: "Saturday", 7: "Sunday"},
+            return_dtype=pl.Categorical
+        ).alias("day_name_str"),
+
+        pl.when(order_weekday >= 6)
+        .then(pl.lit("Weekend", dtype=pl.Categorical))
+        .otherwise(pl.lit("Weekday", dtype=pl.Categorical))
+        .alias("order_day_type"),
+
+        # left_closed keeps the exact "< 60 is Budget" boundary; a price of
+        # exactly 250.00 now classes as Premium instead of Mainstream
+        pl.col("order_item_product_price")
+        .cut(breaks=[60.0, 250.0],
+             labels=["Budget", "Mainstream", "Premium"],
+             left_closed=True)
+        .alias("price_segment"),
+
+        (
+            pl.col("customer_country").cast(pl.Utf8).str.replace("EE. UU.", "USA")
+            + "_"
+            + pl.col("customer_state").cast(pl.Utf8)
+            + " -> "
+            + pl.col("order_country").cast(pl.Utf8)
+        ).cast(pl.Categorical).alias("trade_route")
+    ])
+
+    # --------------------------------------------------------------------------
+    # STEP 4: CONTEXTUAL WINDOW METRICS
+    # --------------------------------------------------------------------------
+    # Group totals are constant within each group, so they are computed once
+    # with O(N) hash aggregations and joined back on the Categorical keys,
+    # instead of windowed sort/partition passes over the whole frame. The
+    # upstream plan is cached so the aggregation branches share one scan.
+    lf = lf.cache()
+
+    category_totals = lf.group_by("category_name").agg(
+        pl.col("gross_sales").sum().alias("_category_total")
+    )
+    state_counts = lf.group_by("order_state").agg(
+        pl.len().alias("state_order_count")
+    )
+    market_totals = lf.group_by("market").agg(
+        pl.col("gross_sales").sum().alias("_market_total")
+    )
+
+    lf = (
+        lf
+        .join(category_totals, on="category_name", how="left")
+        .join(state_counts, on="order_state", how="left")
+        .join(market_totals, on="market", how="left")
+        .with_columns([
+            (pl.col("gross_sales") / pl.col("_category_total"))
+            .alias("category_share_pct"),
+
+            (pl.col("gross_sales") / pl.col("_market_total"))
+            .alias("market_share_pct")
+        ])
+        .drop(["_category_total", "_market_total"])
+        .with_columns([
+            pl.col("state_order_count")
+            .cut(breaks=[9, 100],
+                 labels=["Expansion Zone", "Standard Zone", "Strategic Hub"])
+            .alias("state_density_class")
+        ])
+    )
+
+    # --------------------------------------------------------------------------
+    # STEP 5: STAR SCHEMA ENRICHMENT
+    # --------------------------------------------------------------------------
+    # Dimension tables are scanned lazily so only the joined columns are read.
+    # Their join keys are cast to Categorical to match the fact side, so the
+    # hash joins run on dictionary codes instead of variable-length strings.
+    # cache() pins each (tiny) dimension after its first materialization, so
+    # it can never be re-scanned even if the optimizer duplicates a subplan.
+    dim_geo = pl.scan_parquet(DIM_PATHS["geo"]).with_columns(
+        pl.col(["order_state", "order_country", "order_region", "market"])
+        .cast(pl.Categorical)
+    ).cache()
+    dim_cust = pl.scan_parquet(DIM_PATHS["cust"]).with_columns(
+        pl.col(["customer_state", "customer_country"]).cast(pl.Categorical)
+    ).cache()
+    dim_prod = pl.scan_parquet(DIM_PATHS["prod"]).with_columns(
+        pl.col(["product_name", "category_name", "department_name"])
+        .cast(pl.Categorical)
+    ).cache()
+
+    lf = (
+        lf
+        .join(dim_geo,
+              on=["order_state", "order_country", "order_region", "market"],
+              how="left")
+        .drop(["order_state", "order_country", "order_region", "market"])
+        .join(dim_cust,
+              on=["customer_state", "customer_country"],
+              how="left")
+        .drop(["customer_state", "customer_country"])
+        .join(dim_prod,
+              on=["product_name", "category_name", "department_name"],
+              how="left")
+        .drop(["product_name", "category_name", "department_name"])
+    )
+
+    # --------------------------------------------------------------------------
+    # STEP 6: EXPORT
+    # --------------------------------------------------------------------------
+    # No global sort before the write: Fact_Sales clusters on its own IDENTITY
+    # key, so SQL Server never benefits from pre-sorted input, and parquet
+    # row-group statistics already allow date-range pruning for readers.
+    # Dropping the sort removes the one remaining O(N log N) shuffle.
+
+    # Column naming needs no normalization pass: the source schema contract
+    # already declares lowercase names at the reader, every derived column is
+    # created lowercase, and the dimension tables are curated lowercase (the
+    # joins above reference them that way).
+
+    # sink_parquet executes the whole plan with the streaming engine,
+    # writing row groups to disk instead of collecting the frame in RAM.
+    # zstd level 3 with 256K-row groups keeps dictionary pages effective
+    # for the Categorical columns, and row-group statistics let the SQL
+    # loader skip row groups when it filters
+    lf.sink_parquet(
+        TARGET_FILE_PATH,
+        compression="zstd",
+        compression_level=3,
+        statistics=True,
+        row_group_size=262_144
+    )
+    print(f"Processed file saved to: {TARGET_FILE_PATH}")
+
+    # --------------------------------------------------------------------------
+    # STEP 7: ARCHIVAL (IDEMPOTENCY)
+    # --------------------------------------------------------------------------
+    os.makedirs(ARCHIVE_FOLDER, exist_ok=True)
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    name, ext = os.path.splitext(file_name)
+    archive_name = f"{name}_{timestamp}{ext}"
+
+    shutil.move(SOURCE_FILE_PATH, os.path.join(ARCHIVE_FOLDER, archive_name))
+    print(f"Archived source file as: {archive_name}")
+
+except Exception as e:
+    print("Pipeline failed.")
+    print(f"Error details: {e}")